@@ -1,10 +1,14 @@
+import os
+
+from anyio import CapacityLimiter, to_thread
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 import jwt
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
+from sqlalchemy.orm import defer
 
 from app.models.users import User as UserModel
 from app.config import SECRET_KEY, ALGORITHM
@@ -13,11 +17,22 @@ from app.db_depends import get_async_db
 # Контекст для хеширования с использованием bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt занимает ядро CPU на ~100 мс: больше одновременных хеширований, чем ядер, не ускоряет их,
+# а лишь отнимает потоки общего пула у остального синхронного кода
+_bcrypt_limiter = CapacityLimiter(os.cpu_count() or 1)
+
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token")
 
+# Пользователь для авторизации запроса: хеш пароля не нужен, поэтому не загружается вовсе
+_CURRENT_USER_STMT = (
+    select(UserModel)
+    .options(defer(UserModel.hashed_password, raiseload=True))
+    .where(UserModel.email == bindparam("email"), UserModel.is_active == True)
+)
+
 
 def hash_password(password: str) -> str:
     """
@@ -33,6 +48,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """
+    Хеширует пароль в отдельном потоке, не блокируя event loop.
+    """
+    return await to_thread.run_sync(hash_password, password, limiter=_bcrypt_limiter)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Проверяет пароль в отдельном потоке, не блокируя event loop.
+    """
+    return await to_thread.run_sync(verify_password, plain_password, hashed_password, limiter=_bcrypt_limiter)
+
+
 def create_access_token(data: dict):
     """
     stateless реализация
@@ -63,6 +92,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
                            db: AsyncSession = Depends(get_async_db)):
     """
     Проверяет JWT(декодирует его) и возвращает пользователя из базы.
+    FastAPI кэширует результат зависимости в рамках запроса, поэтому get_current_seller/get_current_buyer/is_admin
+    и обработчик получают один и тот же объект без повторного SELECT.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -82,9 +113,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
         )
     except jwt.PyJWTError:
         raise credentials_exception
-    result = await db.scalars(
-        select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
-    user = result.first()
+    user = await db.scalar(_CURRENT_USER_STMT, {"email": email})
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,173 @@
+import hashlib
+from collections.abc import Awaitable, Callable, Iterable
+
+from cachetools import TTLCache
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import REDIS_URL
+from app.models.categories import Category as CategoryModel
+from app.models.products import Product as ProductModel
+
+
+# --------------- Активность категорий -------------------------
+
+# Категории меняются редко: результат проверки "существует и активна" живёт в памяти процесса 60 секунд.
+# Кэш сбрасывается только в текущем воркере, поэтому он используется лишь на чтении; проверки перед
+# записью (создание товара, родитель категории) идут в БД через category_is_active.
+_category_active_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+# Поколение ключа растёт при каждом сбросе. Между чтением кэша и записью в него выполняется запрос к БД:
+# если за это время категорию сбросили, результат мог устареть и не сохраняется.
+_category_generation: dict[int, int] = {}
+
+# Запрос по Core-таблице: без ORM-контекста выполнения и учёта сущностей
+_categories_table = CategoryModel.__table__
+_CATEGORY_ACTIVE_STMT = select(1).where(_categories_table.c.id == bindparam("category_id"),
+                                        _categories_table.c.is_active == True)
+
+
+async def category_is_active(db: AsyncSession, category_id: int) -> bool:
+    """
+    Возвращает True, если категория существует и активна. Всегда спрашивает БД - для проверок перед записью.
+    """
+    return await db.scalar(_CATEGORY_ACTIVE_STMT, {"category_id": category_id}) is not None
+
+
+async def category_is_active_cached(db: AsyncSession, category_id: int) -> bool:
+    """
+    То же, что category_is_active, но ответ кэшируется по category_id. Только для путей чтения.
+    """
+    is_active = _category_active_cache.get(category_id)
+    if is_active is None:
+        generation = _category_generation.get(category_id, 0)
+        is_active = await category_is_active(db, category_id)
+        if _category_generation.get(category_id, 0) == generation:
+            _category_active_cache[category_id] = is_active
+    return is_active
+
+
+def invalidate_category_cache(category_id: int) -> None:
+    """
+    Сбрасывает закэшированный статус категории после её создания, изменения или удаления.
+    """
+    _category_active_cache.pop(category_id, None)
+    _category_generation[category_id] = _category_generation.get(category_id, 0) + 1
+
+
+# --------------- Активность товаров -------------------------
+
+_products_table = ProductModel.__table__
+_PRODUCT_ACTIVE_STMT = select(1).where(_products_table.c.id == bindparam("product_id"),
+                                       _products_table.c.is_active == True)
+
+
+async def product_is_active(db: AsyncSession, product_id: int) -> bool:
+    """
+    Возвращает True, если товар существует и активен. Без кэша: товары меняются часто.
+    """
+    return await db.scalar(_PRODUCT_ACTIVE_STMT, {"product_id": product_id}) is not None
+
+
+# --------------- Ответы о товарах: память процесса + Redis -------------------------
+
+# Два уровня: локальный TTLCache гасит всплески одинаковых запросов внутри воркера,
+# Redis (если задан REDIS_URL) общий для всех воркеров и переживает их перезапуск.
+# Локальный уровень другого воркера может отдавать старый ответ до LOCAL_CACHE_TTL секунд после изменения.
+LOCAL_CACHE_TTL = 30
+_local_cache: TTLCache = TTLCache(maxsize=1024, ttl=LOCAL_CACHE_TTL)
+
+# Короткий таймаут: недоступный Redis не должен задерживать ответ дольше, чем запрос к БД
+_redis: Redis | None = Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5) if REDIS_URL else None
+
+# Все страницы GET /products/ - поля одного хэша: любое изменение товаров сбрасывает их целиком,
+# точечная инвалидация по фильтрам ненадёжна
+PRODUCTS_LIST_KEY = "products:list"
+
+
+def product_key(product_id: int) -> str:
+    """
+    Ключ кэша карточки товара.
+    """
+    return f"product:{product_id}"
+
+
+def category_products_key(category_id: int) -> str:
+    """
+    Ключ кэша страниц товаров категории (страницы - поля хэша).
+    """
+    return f"category:{category_id}:products"
+
+
+def products_cache_key(params: dict) -> str:
+    """
+    Возвращает поле кэша для набора параметров списка товаров.
+    """
+    return hashlib.blake2b(repr(sorted(params.items())).encode(), digest_size=16).hexdigest()
+
+
+async def cache_get_or_set(key: str, loader: Callable[[], Awaitable[bytes]], ttl: int = 60,
+                           field: str | None = None) -> bytes:
+    """
+    Возвращает сериализованный ответ из кэша, при промахе вызывает loader и сохраняет результат на обоих уровнях.
+    С field значение хранится полем хэша key, чтобы все поля сбрасывались одним удалением key.
+    Ошибки Redis не прерывают запрос: ответ строится из БД.
+    """
+    local_key = key if field is None else (key, field)
+    content = _local_cache.get(local_key)
+    if content is not None:
+        return content
+
+    if _redis is not None:
+        try:
+            content = await (_redis.get(key) if field is None else _redis.hget(key, field))
+        except RedisError as ex:
+            logger.bind(log_id="cache").warning(f"Redis get failed: {ex}")
+    if content is None:
+        # Исключения loader (например, 404) не кэшируются
+        content = await loader()
+        if _redis is not None:
+            try:
+                if field is None:
+                    await _redis.set(key, content, ex=ttl)
+                else:
+                    async with _redis.pipeline(transaction=True) as pipe:
+                        await pipe.hset(key, field, content).expire(key, ttl, nx=True).execute()
+            except RedisError as ex:
+                logger.bind(log_id="cache").warning(f"Redis set failed: {ex}")
+    _local_cache[local_key] = content
+    return content
+
+
+async def cache_delete(*keys: str) -> None:
+    """
+    Удаляет ключи (вместе со всеми полями хэшей) из локального кэша и Redis.
+    """
+    for local_key in list(_local_cache.keys()):
+        if (local_key[0] if isinstance(local_key, tuple) else local_key) in keys:
+            _local_cache.pop(local_key, None)
+    if _redis is not None:
+        try:
+            await _redis.delete(*keys)
+        except RedisError as ex:
+            logger.bind(log_id="cache").warning(f"Redis delete failed: {ex}")
+
+
+async def invalidate_product_cache(product_ids: Iterable[int] = (), category_ids: Iterable[int] = ()) -> None:
+    """
+    Сбрасывает кэш после изменения товаров: их карточки, страницы их категорий и все страницы списка товаров.
+    Все ключи удаляются одним вызовом cache_delete (один DEL в Redis), сколько бы товаров ни изменилось.
+    """
+    await cache_delete(PRODUCTS_LIST_KEY,
+                       *(product_key(product_id) for product_id in set(product_ids)),
+                       *(category_products_key(category_id) for category_id in set(category_ids)))
+
+
+async def close_redis() -> None:
+    """
+    Закрывает соединения с Redis при остановке приложения.
+    """
+    if _redis is not None:
+        await _redis.aclose()
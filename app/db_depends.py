@@ -1,34 +1,27 @@
-from sqlalchemy.orm import Session
-from fastapi import Depends
-from collections.abc import Generator
-
-from app.database import SessionLocal
-
+from collections.abc import AsyncGenerator
 
-# --------------- Синхронная сессия -------------------------
-def get_db() -> Generator[Session, None, None]:
-    """
-    Зависимость для получения сессии базы данных.
-    Создает новую сессию(сеанс) для каждого запроса и закрывает её даже после обработки
-    """
-    db: Session = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+import asyncpg
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database import async_session_maker
 
 
 # --------------- Асинхронная сессия -------------------------
 
-from collections.abc import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import async_session_maker
-
-
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Предоставляет асинхронную сессию SQLAlchemy для работы с базой данных PostgreSQL.
     """
     async with async_session_maker() as session:
         yield session
+
+
+# --------------- Пул asyncpg без ORM -------------------------
+
+async def get_pg_pool(request: Request) -> asyncpg.Pool:
+    """
+    Возвращает общий пул asyncpg, созданный при старте приложения (app.state.pg_pool).
+    Используется горячими read-only эндпоинтами, которым не нужно построение ORM-объектов.
+    """
+    return request.app.state.pg_pool
@@ -1,19 +1,55 @@
+from contextlib import asynccontextmanager
 from uuid import uuid4
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from loguru import logger
 
 from app.routers import categories, products, users, reviews, cart, orders, payments
+from app.database import async_engine, warm_up_pool, create_pg_pool
+from app.config import DB_POOL_WARM_SIZE, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from app.cache import close_redis
 
 # Основной файл проекта - точка входа
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Прогревает пулы соединений при старте и закрывает их при остановке приложения"""
+    try:
+        await warm_up_pool(DB_POOL_WARM_SIZE)
+    except Exception as ex:
+        # База может быть ещё недоступна (например, контейнер db стартует) - соединения откроются по запросу
+        logger.bind(log_id="startup").warning(f"Connection pool warm-up skipped: {ex}")
+    logger.bind(log_id="startup").info(f"Connection pool: {async_engine.pool.status()}")
+    app.state.pg_pool = await create_pg_pool()
+    yield
+    await app.state.pg_pool.close()
+    await close_redis()
+    await async_engine.dispose()
+
+
+# ORJSONResponse: сериализация ответов через orjson вместо стандартного json
 app = FastAPI(title="FastAPI Интернет-магазин",
               version="0.1.0",
-              description="Приложение Интернет-магазин на FastAPI")
+              description="Приложение Интернет-магазин на FastAPI",
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Раздача медиафайлов с долгим кэшированием: имена файлов уникальны для содержимого и никогда не перезаписываются.
+    """
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
 
-app.mount("/media", StaticFiles(directory="media"), name="media")
+app.mount("/media", ImmutableStaticFiles(directory="media"), name="media")
 
 app.include_router(categories.router)
 app.include_router(products.router)
@@ -49,3 +85,32 @@ async def root():
     Корневой маршрут, подтверждающий, что API работает.
     """
     return {"message": "Добро пожаловать в API интернет-магазин"}
+
+
+@app.get(path="/healthz")
+async def healthz():
+    """
+    Проверка работоспособности: число занятых соединений пула для мониторинга и автоскейлинга.
+    """
+    # За PgBouncer используется NullPool, у которого нет счётчика занятых соединений
+    checked_out = async_engine.pool.checkedout() if hasattr(async_engine.pool, "checkedout") else None
+    return {"status": "ok", "pool_checked_out": checked_out}
+
+
+@app.get(path="/metrics")
+async def metrics():
+    """
+    Состояние пула соединений движка: сколько соединений занято, свободно и сверх pool_size.
+    """
+    pool = async_engine.pool
+    # NullPool (за PgBouncer) не хранит соединения, счётчиков у него нет
+    if not hasattr(pool, "checkedout"):
+        return {"pool": None}
+    return {"pool": {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "limit": DB_POOL_SIZE + DB_MAX_OVERFLOW,
+        "status": pool.status(),
+    }}
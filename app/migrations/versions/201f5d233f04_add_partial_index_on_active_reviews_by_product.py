@@ -0,0 +1,32 @@
+"""Add partial index on active reviews by product
+
+Revision ID: 201f5d233f04
+Revises: b4de0f75eb64
+Create Date: 2026-10-15 22:19:05.517804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '201f5d233f04'
+down_revision: Union[str, Sequence[str], None] = 'b4de0f75eb64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reviews_active_product', 'reviews', ['product_id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.execute('ANALYZE reviews')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reviews_active_product', table_name='reviews', postgresql_concurrently=True)
@@ -0,0 +1,40 @@
+"""Add indexes for product list filters
+
+Revision ID: 5b4ede808bd1
+Revises: baf24cd5c925
+Create Date: 2026-10-15 21:56:02.318407
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b4ede808bd1'
+down_revision: Union[str, Sequence[str], None] = 'baf24cd5c925'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY не блокирует запись в таблицу, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_active_cat_price', 'products', ['category_id', 'price'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('ix_products_active_seller', 'products', ['seller_id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('ix_products_created_at', 'products', ['created_at'], unique=False,
+                        postgresql_concurrently=True)
+        # Обновляем статистику, чтобы планировщик сразу начал использовать новые индексы
+        op.execute('ANALYZE products')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_created_at', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_active_seller', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_active_cat_price', table_name='products', postgresql_concurrently=True)
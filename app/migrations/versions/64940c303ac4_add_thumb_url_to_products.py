@@ -0,0 +1,28 @@
+"""Add thumb_url to products
+
+Revision ID: 64940c303ac4
+Revises: 5b4ede808bd1
+Create Date: 2026-10-15 22:01:14.502911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '64940c303ac4'
+down_revision: Union[str, Sequence[str], None] = '5b4ede808bd1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('thumb_url', sa.String(length=200), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'thumb_url')
@@ -0,0 +1,33 @@
+"""Add covering index for active user login
+
+Revision ID: 8b1328c795d3
+Revises: 95ec471cdf95
+Create Date: 2026-10-15 22:10:12.348120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1328c795d3'
+down_revision: Union[str, Sequence[str], None] = '95ec471cdf95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_active_email', 'users', ['email'], unique=False,
+                        postgresql_where=sa.text('is_active'),
+                        postgresql_include=['id', 'role', 'hashed_password'], postgresql_concurrently=True)
+        op.execute('ANALYZE users')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_active_email', table_name='users', postgresql_concurrently=True)
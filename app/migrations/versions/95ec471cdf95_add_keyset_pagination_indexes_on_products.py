@@ -0,0 +1,39 @@
+"""Add keyset pagination indexes on products
+
+Revision ID: 95ec471cdf95
+Revises: 64940c303ac4
+Create Date: 2026-10-15 22:02:40.117305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '95ec471cdf95'
+down_revision: Union[str, Sequence[str], None] = '64940c303ac4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_active_cat_id', 'products', ['category_id', 'id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('ix_products_active_seller_id', 'products', ['seller_id', 'id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        # (seller_id, id) покрывает все запросы, которые обслуживал индекс только по seller_id
+        op.drop_index('ix_products_active_seller', table_name='products', postgresql_concurrently=True)
+        op.execute('ANALYZE products')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_active_seller', 'products', ['seller_id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.drop_index('ix_products_active_seller_id', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_active_cat_id', table_name='products', postgresql_concurrently=True)
@@ -0,0 +1,48 @@
+"""Add rating counters to products
+
+Revision ID: b4de0f75eb64
+Revises: 8b1328c795d3
+Create Date: 2026-10-15 22:16:41.902233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4de0f75eb64'
+down_revision: Union[str, Sequence[str], None] = '8b1328c795d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('rating_sum', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    # Заполняем счётчики по уже существующим активным отзывам и приводим рейтинг в соответствие с ними
+    op.execute("""
+        UPDATE products AS p
+        SET rating_sum = r.grade_sum,
+            rating_count = r.grade_count,
+            rating = r.grade_sum::float / r.grade_count
+        FROM (SELECT product_id, SUM(grade) AS grade_sum, COUNT(*) AS grade_count
+              FROM reviews
+              WHERE is_active
+              GROUP BY product_id) AS r
+        WHERE p.id = r.product_id
+    """)
+    # Товары без активных отзывов: старый рейтинг мог учитывать удалённые отзывы, обнуляем его
+    op.execute("""
+        UPDATE products AS p
+        SET rating = 0, rating_sum = 0, rating_count = 0
+        WHERE NOT EXISTS (SELECT 1 FROM reviews AS r WHERE r.product_id = p.id AND r.is_active)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'rating_count')
+    op.drop_column('products', 'rating_sum')
@@ -0,0 +1,39 @@
+"""Use server-side timestamptz default for Review.comment_date
+
+Revision ID: baf24cd5c925
+Revises: d0d79b22d12f
+Create Date: 2026-10-15 11:02:47.093512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'baf24cd5c925'
+down_revision: Union[str, Sequence[str], None] = 'd0d79b22d12f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие значения записывались datetime.now() контейнера (UTC) - интерпретируем их как UTC
+    op.alter_column('reviews', 'comment_date',
+                    existing_type=sa.DateTime(),
+                    type_=sa.DateTime(timezone=True),
+                    server_default=sa.text('now()'),
+                    existing_nullable=False,
+                    postgresql_using="comment_date AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('reviews', 'comment_date',
+                    existing_type=sa.DateTime(timezone=True),
+                    type_=sa.DateTime(),
+                    server_default=None,
+                    existing_nullable=False,
+                    postgresql_using="comment_date AT TIME ZONE 'UTC'")
@@ -0,0 +1,35 @@
+"""Add partial indexes on active categories and products
+
+Revision ID: d0d79b22d12f
+Revises: 429b5faebf9f
+Create Date: 2026-10-15 10:12:31.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0d79b22d12f'
+down_revision: Union[str, Sequence[str], None] = '429b5faebf9f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_categories_active', 'categories', ['id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('ix_products_active', 'products', ['id'], unique=False,
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_active', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_categories_active', table_name='categories', postgresql_concurrently=True)
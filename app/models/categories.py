@@ -1,4 +1,4 @@
-from sqlalchemy import String, Boolean, ForeignKey
+from sqlalchemy import String, Boolean, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -17,3 +17,8 @@ class Category(Base):
     parent: Mapped["Category | None"] = relationship("Category", back_populates="children", remote_side="Category.id")
 
     children: Mapped[list["Category"]] = relationship("Category", back_populates="parent")
+
+    # Частичный индекс только по активным категориям - под фильтр is_active = true во всех запросах
+    __table_args__ = (
+        Index("ix_categories_active", "id", postgresql_where=text("is_active")),
+    )
@@ -17,9 +17,13 @@ class Product(Base):
     description: Mapped[str | None] = mapped_column(String(500), nullable=True)
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    thumb_url: Mapped[str | None] = mapped_column(String(200), nullable=True)  # WebP-миниатюра 256x256
     stock: Mapped[int] = mapped_column(Integer, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     rating: Mapped[float] = mapped_column(Float, default=0.0, server_default=text('0'))  # Средний рейтинг
+    # Сумма и число оценок активных отзывов: рейтинг пересчитывается из них без сканирования отзывов
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default=text('0'), nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default=text('0'), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),onupdate=func.now(), nullable=False)
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), nullable=False)
@@ -27,6 +31,7 @@ class Product(Base):
 
     #вычисляемое поле tsv
     # PostgreSQL FTS поддерживает 4 уровня весов: A > B > C > D
+    # deferred: вектор нужен только в WHERE поиска, при загрузке товара он не выбирается
     tsv: Mapped[TSVECTOR] = mapped_column(
         TSVECTOR,
         Computed(
@@ -38,6 +43,7 @@ class Product(Base):
             persisted=True,
         ),
         nullable=False,
+        deferred=True,
     )
     # Ограничение ForeignKey обеспечивает целостность данных, не позволяя привязывать товары к несуществующим пользователям.
     category: Mapped["Category"] = relationship("Category", back_populates="products")
@@ -48,4 +54,12 @@ class Product(Base):
 
     __table_args__ = (
         Index("ix_products_tsv_gin", "tsv", postgresql_using="gin"),
-    )
\ No newline at end of file
+        # Частичный индекс только по активным товарам - неактивные строки в него не попадают
+        Index("ix_products_active", "id", postgresql_where=text("is_active")),
+        # Индексы под фильтры списка товаров (GET /products/)
+        Index("ix_products_active_cat_price", "category_id", "price", postgresql_where=text("is_active")),
+        # Keyset-пагинация по id внутри категории и продавца: фильтр и ORDER BY id обслуживает один индекс
+        Index("ix_products_active_cat_id", "category_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_seller_id", "seller_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_created_at", "created_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, DateTime, Text, Boolean, Integer
+from sqlalchemy import ForeignKey, DateTime, Text, Boolean, Integer, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 
@@ -10,11 +10,17 @@ class Review(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
-    comment_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, nullable=False)
+    # Время создания проставляет сама БД при INSERT (TIMESTAMPTZ)
+    comment_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     grade: Mapped[int] = mapped_column(Integer, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False)
 
     buyer: Mapped["User"] = relationship("User", back_populates="reviews")
-    product: Mapped["Product"] = relationship("Product", back_populates="reviews")
\ No newline at end of file
+    product: Mapped["Product"] = relationship("Product", back_populates="reviews")
+
+    __table_args__ = (
+        # Отзывы товара (и пачки товаров) выбираются только среди активных: удалённые отзывы в индекс не попадают
+        Index("ix_reviews_active_product", "product_id", postgresql_where=text("is_active")),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Integer, String
+from sqlalchemy import Boolean, Integer, String, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -18,3 +18,9 @@ class User(Base):
     #cascade="all, delete-orphan" гарантирует, что при удалении пользователя его корзина будет очищена
     cart_items: Mapped[list["CartItem"]] = relationship("CartItem", back_populates="user", cascade="all, delete-orphan")
     orders: Mapped[list["Order"]] = relationship("Order", back_populates="user", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Покрывающий частичный индекс для входа: столбцы ответа лежат в индексе, index-only scan без чтения таблицы
+        Index("ix_users_active_email", "email", postgresql_where=text("is_active"),
+              postgresql_include=["id", "role", "hashed_password"]),
+    )
@@ -0,0 +1,29 @@
+from sqlalchemy import Select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def paginate(db: AsyncSession, stmt: Select, params: dict, page: int, page_size: int, after_id: int | None,
+                   order_col, total_col=None) -> tuple[list[Row], int | None, int | None]:
+    """
+    Выбирает страницу в порядке order_col и возвращает её вместе с курсором следующей страницы
+    и общим количеством, если передан оконный столбец total_col (с меткой total).
+    order_col должен быть уникальным и входить в выбираемые столбцы: по нему строится курсор.
+    """
+    # На одну строку больше page_size: по ней видно, есть ли следующая страница
+    stmt = stmt.order_by(order_col).limit(page_size + 1)
+    # Keyset: WHERE order_col > after_id идёт по индексу, не пропуская строки как OFFSET
+    if after_id is not None:
+        stmt = stmt.where(order_col > after_id)
+    else:
+        stmt = stmt.offset((page - 1) * page_size)
+    if total_col is not None:
+        stmt = stmt.add_columns(total_col)
+    # all() возвращает все результаты запроса в виде списка строк с доступом к столбцам как к атрибутам
+    items = (await db.execute(stmt, params)).all()
+    total = items[0].total if total_col is not None and items else None
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = getattr(items[-1], order_col.key)
+    return items, next_cursor, total
@@ -1,87 +1,109 @@
 from decimal import Decimal
+
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import select, delete
+from pydantic import TypeAdapter
+from sqlalchemy import select, update, delete, exists, func, bindparam, literal, Numeric
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, joinedload
 
 from app.auth import get_current_user
 from app.db_depends import get_async_db
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.products import Product as ProductModel
 from app.models.users import User as UserModel
+from app.cache import product_is_active
 from app.schemas import (Cart as CartSchema, CartItem as CartItemSchema, CartItemCreate, CartItemUpdate)
 
 router = APIRouter(prefix="/cart", tags=["carts"])
 
-
-async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    product = product_result.first()
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
-
-
-async def _get_cart_item(db: AsyncSession, user_id: int, product_id: int) -> CartItemModel | None:
-    cart_item_result = await db.scalars(
-        select(CartItemModel).options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == user_id, CartItemModel.product_id == product_id))
-    cart_item = cart_item_result.first()
-    return cart_item
+# Запросы собираются один раз при импорте модуля, значения подставляются через bindparam.
+# Так SQLAlchemy не строит выражение заново на каждый запрос и стабильно попадает в кэш компиляции.
+# joinedload: товары нужны для каждой позиции, поэтому один JOIN вместо второго запроса WHERE id IN (...)
+_CART_ITEMS_STMT = (
+    select(CartItemModel)
+    .options(joinedload(CartItemModel.product))
+    .where(CartItemModel.user_id == bindparam("user_id"))
+    .order_by(CartItemModel.id)
+)
+_CART_TOTALS_STMT = (
+    select(func.coalesce(func.sum(CartItemModel.quantity), 0),
+           # Пустая корзина: 0.00 типа Numeric(10, 2), а не целый 0 - формат суммы тот же, что у непустой
+           func.coalesce(func.sum(CartItemModel.quantity * ProductModel.price),
+                         literal(Decimal("0.00"), Numeric(10, 2))))
+    .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+    .where(CartItemModel.user_id == bindparam("user_id"))
+)
+# Позиции корзины валидируются из ORM-объектов одним вызовом для всего списка
+_CART_ITEMS_ADAPTER = TypeAdapter(list[CartItemSchema])
 
 
 @router.get(path="/", response_model=CartSchema, status_code=status.HTTP_200_OK)
 async def get_cart(db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_user)):
     """Возвращает корзину текущего пользователя"""
-    cart_items_result = await db.scalars(select(CartItemModel).options(selectinload(CartItemModel.product)).where(CartItemModel.user_id == current_user.id).order_by(CartItemModel.id))
+    cart_items_result = await db.scalars(_CART_ITEMS_STMT, {"user_id": current_user.id})
     cart_items = cart_items_result.all()
-    total_quantity = sum(item.quantity for item in cart_items)
-    price_items = (Decimal(item.quantity) * (item.product.price if item.product.price is not None else Decimal("0")) for item in cart_items)
-    total_price_decimal = sum(price_items, Decimal("0.00"))
-    return CartSchema(user_id=current_user.id, items=cart_items, total_quantity=total_quantity,total_price=total_price_decimal)
+    # Итоги считает PostgreSQL, а не цикл с Decimal-арифметикой в Python
+    total_quantity, total_price = (await db.execute(_CART_TOTALS_STMT, {"user_id": current_user.id})).one()
+    items = _CART_ITEMS_ADAPTER.validate_python(cart_items, from_attributes=True)
+    cart = CartSchema(user_id=current_user.id, items=items, total_quantity=total_quantity, total_price=total_price)
+    # Модель уже проверена: сериализуем её сразу, без повторной валидации через response_model
+    return Response(content=cart.model_dump_json(), media_type="application/json")
 
 
 @router.post(path="/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(payload: CartItemCreate, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_user)):
     """Добавляет товар в корзину пользователя или увеличивает его количество, если он уже есть"""
-    await _ensure_product_available(db, payload.product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, payload.product_id)
-
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(user_id=current_user.id, product_id=payload.product_id, quantity=payload.quantity)
-        db.add(cart_item)
+    if not await product_is_active(db, payload.product_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
 
+    # Атомарный upsert по уникальному ключу (user_id, product_id): без гонки между SELECT и INSERT
+    stmt = insert(CartItemModel).values(user_id=current_user.id, product_id=payload.product_id,
+                                        quantity=payload.quantity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+        set_={"quantity": CartItemModel.quantity + stmt.excluded.quantity, "updated_at": func.now()},
+    ).returning(CartItemModel).options(selectinload(CartItemModel.product))
+    # Товар для ответа загружается selectinload сразу после upsert: ленивая загрузка в AsyncSession невозможна
+    cart_item = await db.scalar(stmt, execution_options={"populate_existing": True})
+
+    # expire_on_commit=False: объект и загруженный товар остаются актуальными после коммита
     await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    return updated_item
+    return cart_item
 
 
 @router.put(path="/items/{product_id}", response_model=CartItemSchema, status_code=status.HTTP_200_OK)
 async def update_cart_item(product_id: int, payload: CartItemUpdate, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_user)):
     """Обновляет количество товара в корзине пользователя"""
-    await _ensure_product_available(db, product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    # UPDATE ... RETURNING с проверкой активности товара в том же запросе
+    cart_item = await db.scalar(
+        update(CartItemModel)
+        .where(CartItemModel.user_id == current_user.id, CartItemModel.product_id == product_id,
+               exists().where(ProductModel.id == CartItemModel.product_id, ProductModel.is_active == True))
+        .values(quantity=payload.quantity)
+        .returning(CartItemModel)
+        .options(selectinload(CartItemModel.product)))
+    if cart_item is None:
+        # Запасной путь только для ошибки: уточняем, чего именно не хватает
+        if not await product_is_active(db, product_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
 
-    cart_item.quantity = payload.quantity
     await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    return cart_item
 
 
 @router.delete(path="items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_item_from_cart(product_id: int, db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_user)):
     """Удаляет указанный товар из корзины пользователя"""
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    # DELETE ... RETURNING id: без загрузки ORM-объекта ради проверки существования
+    cart_item_id = await db.scalar(
+        delete(CartItemModel)
+        .where(CartItemModel.user_id == current_user.id, CartItemModel.product_id == product_id)
+        .returning(CartItemModel.id))
+    if cart_item_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
 
-    await db.delete(cart_item)
     await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -89,7 +111,9 @@ async def remove_item_from_cart(product_id: int, db: AsyncSession = Depends(get_
 @router.delete(path="/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(db: AsyncSession = Depends(get_async_db), current_user: UserModel = Depends(get_current_user)):
     """Выполняет полную очистку корзины"""
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
+    # В сессии запроса нет загруженных позиций корзины - синхронизировать identity map не нужно
+    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id)
+                     .execution_options(synchronize_session=False))
     await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -1,26 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, update
-# from sqlalchemy.orm import Session
+import time
+
+import asyncpg
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.categories import Category as CategoryModel
 from app.models.users import User as UserModel
 from app.schemas import Category as CategorySchema, CategoryCreate as CategoryCreateSchema
-from app.db_depends import get_db, get_async_db
+from app.cache import category_is_active, invalidate_category_cache, cache_delete, category_products_key
+from app.db_depends import get_async_db, get_pg_pool
 from app.auth import is_admin
 
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
+# Список категорий читается напрямую через asyncpg, без построения ORM-объектов
+_ACTIVE_CATEGORIES_SQL = "SELECT id, name, parent_id, is_active FROM categories WHERE is_active"
+
+# Категории меняются редко: список кэшируется в памяти процесса и в браузере/CDN на CATEGORIES_CACHE_TTL секунд
+CATEGORIES_CACHE_TTL = 30
+_categories_cache: dict = {"expires_at": 0.0, "value": None}
+# Весь список валидируется и сериализуется одним вызовом pydantic-core, а не поэлементно через response_model
+_CATEGORY_LIST_ADAPTER = TypeAdapter(list[CategorySchema])
+
+
+def _invalidate_categories_cache() -> None:
+    """Сбрасывает кэш списка категорий после изменения категорий"""
+    _categories_cache["value"] = None
+
 
 @router.get(path="/", response_model=list[CategorySchema])
-async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
+async def get_all_categories(pool: asyncpg.Pool = Depends(get_pg_pool)):
     """
     Возвращает список всех активных категорий товаров.
     """
-    result = await db.scalars(select(CategoryModel).where(CategoryModel.is_active == True))
-    categories = result.all()
-    return categories
+    now = time.monotonic()
+    content = _categories_cache["value"]
+    if content is None or now >= _categories_cache["expires_at"]:
+        async with pool.acquire() as connection:
+            rows = await connection.fetch(_ACTIVE_CATEGORIES_SQL)
+        # В кэше хранится готовый JSON: повторные запросы не тратят время на сериализацию
+        content = _CATEGORY_LIST_ADAPTER.dump_json(_CATEGORY_LIST_ADAPTER.validate_python([dict(row) for row in rows]))
+        _categories_cache.update(value=content, expires_at=now + CATEGORIES_CACHE_TTL)
+
+    # response_model остаётся для документации, ответ уже сериализован
+    return Response(content=content, media_type="application/json",
+                    headers={"Cache-Control": f"public, max-age={CATEGORIES_CACHE_TTL}"})
 
 
 @router.post(path="/", response_model=CategorySchema, status_code=status.HTTP_201_CREATED)
@@ -31,17 +58,17 @@ async def create_category(category: CategoryCreateSchema,
     Создает новую категорию.
     """
     # db.scalars(), db.commit(),  db.refresh(), db.execute(), являются асинхронными
+    # Родитель проверяется через select(1) без загрузки ORM-объекта категории (без кэша - это запись)
     if category.parent_id is not None:
-        stmt = select(CategoryModel).where(CategoryModel.id == category.parent_id, CategoryModel.is_active == True)
-        result = await db.scalars(stmt)
-        parent = result.first()
-        if parent is None:
+        if not await category_is_active(db, category.parent_id):
             raise HTTPException(status_code=400, detail="Parent category not found")
 
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
+    # refresh() не нужен: id приходит через RETURNING при INSERT, а expire_on_commit=False сохраняет атрибуты
     await db.commit()
-    await db.refresh(db_category)
+    _invalidate_categories_cache()
+    invalidate_category_cache(db_category.id)
     return db_category
 
 
@@ -53,33 +80,27 @@ async def update_category(category_id: int,
     """
     Обновляет категорию по её ID
     """
-    stmt = select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
-    result = await db.scalars(stmt)
-    db_category = result.first()
-
-    if db_category is None:
-        raise HTTPException(status_code=404, detail="Category not found")
-
     if category.parent_id is not None:
-        parent_stmt = select(CategoryModel).where(CategoryModel.id == category.parent_id,
-                                                  CategoryModel.is_active == True)
-        parent_result = await db.scalars(parent_stmt)
-        parent = parent_result.first()
-
-        if not parent:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parent category not found")
-        if parent.id == category_id:
+        if category.parent_id == category_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category cannot be its own parent")
+        if not await category_is_active(db, category.parent_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parent category not found")
 
     # параметр exclude_unset=True обновляет только переданные поля
     update_data = category.model_dump(exclude_unset=True)
-    await db.execute(
+    # UPDATE ... RETURNING: проверка существования, обновление и получение строки за один запрос
+    db_category = await db.scalar(
         update(CategoryModel)
-        .where(CategoryModel.id == category_id)
+        .where(CategoryModel.id == category_id, CategoryModel.is_active == True)
         .values(**update_data)
+        .returning(CategoryModel)
     )
+    if db_category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+
     await db.commit()
-    await db.refresh(db_category)
+    _invalidate_categories_cache()
+    invalidate_category_cache(db_category.id)
     return db_category
 
 
@@ -90,18 +111,19 @@ async def delete_category(category_id: int,
     """
     Выполняет мягкое удаление(логическое и возвращает категорию) категории по её ID, устанавливая is_active = False.
     """
-    stmt = select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
-    result = await db.scalars(stmt)
-    db_category = result.first()
-
-    if db_category is None:
-        raise HTTPException(status_code=404, detail="Category not found")
-
     # Логическое удаление категории (установка is_active=False)
-    await db.execute(
+    db_category = await db.scalar(
         update(CategoryModel)
-        .where(CategoryModel.id == category_id)
+        .where(CategoryModel.id == category_id, CategoryModel.is_active == True)
         .values(is_active=False)
+        .returning(CategoryModel)
     )
+    if db_category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+
     await db.commit()
+    _invalidate_categories_cache()
+    invalidate_category_cache(db_category.id)
+    # Страницы товаров удалённой категории сбрасываются сразу, карточки её товаров истекают по TTL
+    await cache_delete(category_products_key(db_category.id))
     return db_category
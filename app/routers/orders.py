@@ -12,19 +12,19 @@ from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
 from app.models.users import User as UserModel
 from app.schemas import Order as OrderSchema, OrderList as OrderListSchema, OrderCheckoutResponse
 from app.payments import create_yookassa_payment
+from app.cache import invalidate_product_cache
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
 async def _load_order_with_items(db: AsyncSession, order_id: int) -> OrderModel | None:
-    result = await db.scalars(
+    return await db.scalar(
         select(OrderModel)
         .options(
             selectinload(OrderModel.items).selectinload(OrderItemModel.product),
         )
         .where(OrderModel.id == order_id)
     )
-    return result.first()
 
 
 @router.post(path="/checkout", response_model=OrderCheckoutResponse, status_code=status.HTTP_201_CREATED)
@@ -96,6 +96,9 @@ async def checkout_order(db: AsyncSession = Depends(get_async_db), current_user:
 
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
     await db.commit()
+    # Остатки купленных товаров изменились: их карточки и списки в кэше устарели
+    await invalidate_product_cache(product_ids=[cart_item.product.id for cart_item in cart_items],
+                                   category_ids=[cart_item.product.category_id for cart_item in cart_items])
 
     created_order = await _load_order_with_items(db, order.id)
     if not created_order:
@@ -142,8 +145,7 @@ async def get_order(order_id: int, db: AsyncSession = Depends(get_async_db),
 async def get_order_status(order_id: int, db: AsyncSession = Depends(get_async_db),
                            current_user: UserModel = Depends(get_current_user)):
     """Возвращает краткую информацию о заказе и его статус"""
-    order_result = await db.scalars(select(OrderModel).where(OrderModel.id == order_id))
-    order = order_result.first()
+    order = await db.scalar(select(OrderModel).where(OrderModel.id == order_id))
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     if order.user_id != current_user.id:
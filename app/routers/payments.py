@@ -79,8 +79,7 @@ async def yookassa_webhook(request: Request, db: AsyncSession = Depends(get_asyn
     if not order_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing order id")
 
-    result = await db.scalars(select(OrderModel).where(OrderModel.id == int(order_id)))
-    order = result.first()
+    order = await db.scalar(select(OrderModel).where(OrderModel.id == int(order_id)))
     if order is None:
         return {"status": "ignored"}
 
@@ -1,146 +1,312 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi import UploadFile, File, Form
-from sqlalchemy.sql import select, update, func, desc, and_
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from fastapi import UploadFile, File, Form, BackgroundTasks
+from pydantic import TypeAdapter
+from sqlalchemy.sql import select, update, func, desc, and_, or_, exists, bindparam
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, aliased
 
 from app.models.products import Product as ProductModel
 from app.models.categories import Category as CategoryModel
 from app.models.users import User as UserModel
-from app.schemas import Product as ProductSchema, ProductCreate as ProductCreateSchema, ProductList
+from app.schemas import Product as ProductSchema, ProductCreate as ProductCreateSchema, ProductList, ProductFilters
+from app.config import DEBUG
+from app.database import async_session_maker
 from app.db_depends import get_async_db
 from app.auth import get_current_seller
-from datetime import datetime
-
+from app.pagination import paginate
+from app.cache import (category_is_active, category_is_active_cached, cache_get_or_set, invalidate_product_cache,
+                       product_is_active, products_cache_key, product_key, category_products_key, PRODUCTS_LIST_KEY)
+from typing import Annotated
+
+import asyncio
+from contextlib import suppress
+import hashlib
+import os
 from pathlib import Path
 import uuid
 
+import aiofiles
+import aiofiles.os
+from PIL import Image
+
 router = APIRouter(prefix="/products", tags=["products"])
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MEDIA_ROOT = BASE_DIR / "media" / "products"
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+# Строковые пути для горячих участков: os.path.join дешевле построения объектов Path на каждый запрос
+_BASE_DIR_STR = str(BASE_DIR)
+_MEDIA_ROOT_STR = str(MEDIA_ROOT)
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 MAX_IMAGE_SIZE = 2 * 1024 * 1024  # 2 097 152 байт
+IMAGE_CHUNK_SIZE = 64 * 1024
+THUMBNAIL_SIZE = (256, 256)
 
 
-async def save_product_image(file: UploadFile) -> str:
+def _image_extension(header: bytes) -> str | None:
     """
-    Сохраняет изображение товара и возвращает относительный URL по которому это изображение будет доступно через веб-сервер.
+    Определяет расширение файла по сигнатуре JPEG, PNG или WebP в первых байтах, None - не изображение.
+    Имя файла от клиента не используется: одно и то же содержимое всегда получает одно имя на диске.
     """
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only JPG, PNG or WebP images are allowed")
-    content = await file.read()
-    if len(content) > MAX_IMAGE_SIZE:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is too large")
-    extensions = Path(file.filename or "").suffix.lower() or ".jpg"
-    file_name = f"{uuid.uuid4()}{extensions}"
-    file_path = MEDIA_ROOT / file_name
-    file_path.write_bytes(content)
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+# ProductSchema не содержит связей, поэтому eager-загрузка не нужна. В режиме разработки raiseload("*")
+# превращает любое случайное обращение к связи при сериализации (скрытый N+1) в ошибку.
+_PRODUCT_LOAD_OPTIONS = (raiseload("*"),) if DEBUG else ()
+
+# Списки выбирают только столбцы ProductSchema: без tsv и служебных полей, без построения ORM-объектов
+_PRODUCT_LIST_COLS = (ProductModel.id, ProductModel.name, ProductModel.description, ProductModel.price,
+                      ProductModel.image_url, ProductModel.thumb_url, ProductModel.rating, ProductModel.stock,
+                      ProductModel.category_id, ProductModel.is_active)
+
+# Запросы собираются один раз при импорте модуля, значения подставляются через bindparam
+_CATEGORY_PRODUCTS_STMT = (
+    select(*_PRODUCT_LIST_COLS)
+    .join(CategoryModel, CategoryModel.id == ProductModel.category_id)
+    .where(ProductModel.category_id == bindparam("category_id"), ProductModel.is_active == True,
+           CategoryModel.is_active == True)
+)
+_ACTIVE_PRODUCT_STMT = (
+    select(ProductModel)
+    .options(*_PRODUCT_LOAD_OPTIONS)
+    .join(CategoryModel, CategoryModel.id == ProductModel.category_id)
+    .where(ProductModel.id == bindparam("product_id"), ProductModel.is_active == True,
+           CategoryModel.is_active == True)
+)
+# Проверки использования файла строятся по Core-таблице: без ORM-контекста выполнения и учёта сущностей
+_products_table = ProductModel.__table__
+_PRODUCT_SELLER_STMT = select(ProductModel.seller_id).where(ProductModel.id == bindparam("product_id"),
+                                                            ProductModel.is_active == True)
+_SOFT_DELETE_PRODUCT_STMT = (
+    update(ProductModel)
+    .where(ProductModel.id == bindparam("product_id"), ProductModel.is_active == True,
+           ProductModel.seller_id == bindparam("seller_id"))
+    .values(is_active=False)
+    .returning(ProductModel)
+)
+# Файл может быть и изображением, и миниатюрой: у товаров, загруженных до определения расширения по сигнатуре,
+# одно содержимое может храниться под разными image_url с общей миниатюрой
+_FILE_IN_USE_STMT = select(1).where(or_(_products_table.c.image_url == bindparam("url"),
+                                        _products_table.c.thumb_url == bindparam("url")),
+                                    _products_table.c.is_active == True).limit(1)
+
+# Подзапрос в RETURNING видит снимок до UPDATE: так UPDATE возвращает и прежнюю категорию товара
+_OldProduct = aliased(ProductModel)
+_OLD_CATEGORY_ID = select(_OldProduct.category_id).where(_OldProduct.id == bindparam("product_id")).scalar_subquery()
+
+# Страница товаров сериализуется сразу в JSON-байты одним вызовом pydantic-core, минуя response_model
+_PRODUCT_PAGE_ADAPTER = TypeAdapter(ProductList)
+
+
+def _dump_product_page(rows: list[Row], total: int | None, page: int, page_size: int,
+                       next_cursor: int | None) -> bytes:
+    """
+    Сериализует страницу товаров в JSON. Строки пришли из БД и уже соответствуют схеме,
+    поэтому модели собираются через model_construct без повторной валидации; лишние столбцы (rank, total) отбрасываются.
+    """
+    items = [ProductSchema.model_construct(**row._mapping) for row in rows]
+    return _PRODUCT_PAGE_ADAPTER.dump_json(ProductList.model_construct(
+        items=items, total=total, page=page, page_size=page_size, next_cursor=next_cursor))
 
-    return f"/media/products/{file_name}"
 
+def _make_thumbnail(src_path: str, thumb_path: str) -> None:
+    """
+    Строит WebP-миниатюру не больше THUMBNAIL_SIZE. Выполняется в отдельном потоке: ресайз нагружает CPU.
+    Если изображение не удалось сохранить, недописанный файл миниатюры удаляется.
+    """
+    try:
+        with Image.open(src_path) as image:
+            image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+            image.save(thumb_path, "WEBP", quality=80, method=4)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(thumb_path)
+        raise
+
+
+async def save_product_image(file: UploadFile) -> tuple[str, str]:
+    """
+    Сохраняет изображение товара и его миниатюру, возвращает относительные URL по которым они будут доступны через веб-сервер.
+    Файл пишется потоково блоками по IMAGE_CHUNK_SIZE, не загружаясь в память целиком.
+    Имя файла - SHA-256 содержимого: повторная загрузка того же изображения не создаёт копию на диске.
+    """
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only JPG, PNG or WebP images are allowed")
+    # Сигнатура проверяется до чтения остального файла: подменённый Content-Type отклоняется сразу
+    header = await file.read(12)
+    extensions = _image_extension(header)
+    if extensions is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only JPG, PNG or WebP images are allowed")
 
-def remove_product_image(url: str | None) -> None:
+    # Хэш считается по ходу записи во временный файл, итоговое имя известно только в конце.
+    # Временные файлы лежат в MEDIA_ROOT: каталог по хэшу создаётся только после всех проверок
+    tmp_name = uuid.uuid4()
+    tmp_path = os.path.join(_MEDIA_ROOT_STR, f".{tmp_name}.part")
+    tmp_thumb_path = os.path.join(_MEDIA_ROOT_STR, f".{tmp_name}.thumb.part")
+    hasher = hashlib.sha256(header)
+    total_size = len(header)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            await out.write(header)
+            while chunk := await file.read(IMAGE_CHUNK_SIZE):
+                total_size += len(chunk)
+                if total_size > MAX_IMAGE_SIZE:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is too large")
+                hasher.update(chunk)
+                await out.write(chunk)
+
+        digest = hasher.hexdigest()
+        relative_path = f"{digest[:2]}/{digest}{extensions}"
+        thumb_relative_path = f"{digest[:2]}/{digest}.thumb.webp"
+        file_dir = os.path.join(_MEDIA_ROOT_STR, digest[:2])
+        file_path = os.path.join(file_dir, f"{digest}{extensions}")
+        thumb_path = os.path.join(file_dir, f"{digest}.thumb.webp")
+        thumb_exists = await aiofiles.os.path.exists(thumb_path)
+        if not thumb_exists:
+            # Миниатюра строится из временного файла: изображение, которое не декодируется, отклоняется до публикации
+            try:
+                await asyncio.to_thread(_make_thumbnail, tmp_path, tmp_thumb_path)
+            except (OSError, Image.DecompressionBombError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file")
+        await aiofiles.os.makedirs(file_dir, exist_ok=True)
+        if not thumb_exists:
+            await aiofiles.os.replace(tmp_thumb_path, thumb_path)
+        if await aiofiles.os.path.exists(file_path):
+            await aiofiles.os.remove(tmp_path)
+        else:
+            await aiofiles.os.replace(tmp_path, file_path)
+    except BaseException:
+        # Недописанные файлы не должны оставаться на диске
+        for path in (tmp_path, tmp_thumb_path):
+            with suppress(FileNotFoundError):
+                await aiofiles.os.remove(path)
+        raise
+
+    return f"/media/products/{relative_path}", f"/media/products/{thumb_relative_path}"
+
+
+async def delete_image_file(url: str) -> None:
+    """
+    Удаляет файл изображения с диска, если он существует и не используется ни одним активным товаром.
     """
-    Удаляет файл изображения, если он существует.
+    # Одинаковые изображения хранятся одним файлом. Проверка выполняется в фоновой задаче непосредственно
+    # перед удалением и в своей сессии: сессия запроса к этому моменту уже закрыта, а проверка во время
+    # запроса не увидела бы товары, которые получили ту же ссылку позже, но до запуска задачи.
+    async with async_session_maker() as db:
+        if await db.scalar(_FILE_IN_USE_STMT, {"url": url}):
+            return
+    # Без предварительной проверки exists(): отсутствие файла обрабатывается исключением, без лишнего stat и гонки
+    file_path = os.path.join(_BASE_DIR_STR, url.lstrip("/"))
+    with suppress(FileNotFoundError):
+        await aiofiles.os.remove(file_path)
+
+
+def remove_product_image(image_url: str | None, thumb_url: str | None, background_tasks: BackgroundTasks) -> None:
     """
-    if not url:
-        return
-    relative_path = url.lstrip("/")
-    file_path = BASE_DIR / relative_path
-    if file_path.exists():
-        file_path.unlink()
+    Планирует удаление изображения товара и его миниатюры после ответа, если они не используются другими активными товарами.
+    """
+    # Фоновые задачи запускаются после отправки ответа, то есть после фиксации транзакции:
+    # сам товар к этому моменту уже ссылается на новый файл или неактивен
+    if image_url:
+        background_tasks.add_task(delete_image_file, image_url)
+    if thumb_url:
+        background_tasks.add_task(delete_image_file, thumb_url)
 
 
-# Вынести параметры запроса в pydantic модель валидации, сделать обработку даты
 @router.get(path="/", response_model=ProductList, status_code=status.HTTP_200_OK)
-async def get_all_products(page: int = Query(1, ge=1),
-                           page_size: int = Query(20, ge=1, le=100),
-                           category_id: int | None = Query(None, description="ID категории для фильтрации"),
-                           search: str | None = Query(None, min_length=1, description="Поиск по названию/описанию"),
-                           min_price: float | None = Query(None, ge=0,
-                                                           description="Минимальная цена товара для фильтрации"),
-                           max_price: float | None = Query(None, ge=0,
-                                                           description="Максимальная цена товара для фильтрации"),
-                           in_stock: bool | None = Query(None,
-                                                         description="true -только товары в наличии, false - только без остатка для фильтрации"),
-                           created_at: datetime | None = Query(None,
-                                                               description="Дата создания товара и время YYYY-MM-DD HH:MM:SS"),
-                           seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
+async def get_all_products(params: Annotated[ProductFilters, Query()],
                            db: AsyncSession = Depends(get_async_db)):
     """
     Возвращает список всех активных товаров с поддержкой пагинации, фильтрации(динамические фильтры) и полнотекстового поиска PostgreSQL FTS(name,descriprion)
+    Без поиска поддерживается keyset-пагинация: next_cursor из ответа передаётся в after_id следующего запроса.
     """
-    # Проверка логики min_price <= max_price
-    if min_price is not None and max_price is not None and min_price > max_price:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_price не может быть больше max_price")
+    # Одинаковые комбинации фильтров и страницы отдаются из кэша без запросов к БД
+    content = await cache_get_or_set(PRODUCTS_LIST_KEY, lambda: _load_products_page(params, db), ttl=30,
+                                     field=products_cache_key(params.model_dump()))
+    # response_model остаётся для документации, ответ отдаётся готовым JSON
+    return Response(content=content, media_type="application/json")
+
 
+async def _load_products_page(params: ProductFilters, db: AsyncSession) -> bytes:
+    """
+    Выбирает страницу списка товаров по фильтрам и возвращает её сериализованной в JSON.
+    """
     # Формируем список фильтров
     # все запросы (с фильтрами или без) будут возвращать только активные товары (где поле is_active равно True в базе данных)
 
     filters = [ProductModel.is_active == True]
 
     # Реализоция динамических фильтров
-    if category_id is not None:
-        filters.append(ProductModel.category_id == category_id)
-    if min_price is not None:
-        filters.append(ProductModel.price >= min_price)
-    if max_price is not None:
-        filters.append(ProductModel.price <= max_price)
-    if in_stock is not None:
+    if params.category_id is not None:
+        filters.append(ProductModel.category_id == params.category_id)
+    if params.min_price is not None:
+        filters.append(ProductModel.price >= params.min_price)
+    if params.max_price is not None:
+        filters.append(ProductModel.price <= params.max_price)
+    if params.in_stock is not None:
         # тернарный оператор возвращает не bool, а само выражение - инструкция для будущего SQL-запроса(SQLAlchemy переопределяет __gt__, __eq__, и т.д)
-        filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
-    if seller_id is not None:
-        filters.append(ProductModel.seller_id == seller_id)
-    if created_at is not None:
-        filters.append(ProductModel.created_at >= created_at)
-
-    # Базовый запрос total подсчёт общего количества с учётом фильтров
-    total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+        filters.append(ProductModel.stock > 0 if params.in_stock else ProductModel.stock == 0)
+    if params.seller_id is not None:
+        filters.append(ProductModel.seller_id == params.seller_id)
+    if params.created_at is not None:
+        filters.append(ProductModel.created_at >= params.created_at)
 
     rank_col = None
-    if search:
-        search_value = search.strip()
+    if params.search:
+        search_value = params.search.strip()
         if search_value:
-            ts_query = func.websearch_to_tsquery('english', search_value)
+            # tsquery разбирается один раз в CTE и переиспользуется фильтром и ранжированием
+            ts_query = select(func.websearch_to_tsquery('english', search_value).label("tsq")).cte("q").c.tsq
             filters.append(ProductModel.tsv.op('@@')(ts_query))
             rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label("rank")
-            # total с учётом полнотекстового фильтра
-            total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
 
-    total = await db.scalar(total_stmt) or 0
+    # Общее количество считается только по явному запросу клиента - оконной функцией в том же запросе, что и страница.
+    # С курсором after_id окно видит лишь строки после курсора, поэтому тогда нужен отдельный COUNT
+    total = None
+    total_col = func.count().over().label("total") if params.include_total and params.after_id is None else None
 
     # Основной запрос (если есть поиск — добавим ранг в выборку и сортировку)
+    next_cursor = None
     if rank_col is not None:
         products_stmt = (
-            select(ProductModel, rank_col)
+            select(*_PRODUCT_LIST_COLS, rank_col)
             .where(*filters)
             .order_by(desc(rank_col), ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
+            .offset((params.page - 1) * params.page_size)
+            .limit(params.page_size)
         )
+        if total_col is not None:
+            products_stmt = products_stmt.add_columns(total_col)
+        # Порядок по рангу не монотонен по id, поэтому поиск остаётся на пагинации через page
         result = await db.execute(products_stmt)
-        rows = result.all()
-        items = [row[0] for row in rows]  # сами объекты
+        items = result.all()
+        if total_col is not None and items:
+            total = items[0].total
         # при желании можно вернуть ранг в ответе
-        # ranks = [row.rank for row in rows]
+        # ranks = [row.rank for row in items]
     else:
-        products_stmt = (
-            select(ProductModel)
-            .where(*filters)
-            .order_by(ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        # all() возвращает все результаты запроса в виде списка
-        items = (await db.scalars(products_stmt)).all()
+        products_stmt = select(*_PRODUCT_LIST_COLS).where(*filters)
+        items, next_cursor, total = await paginate(db, products_stmt, {}, params.page, params.page_size,
+                                                   params.after_id, ProductModel.id, total_col)
 
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-    }
+    if params.include_total and total is None:
+        # Пустая первая страница означает, что товаров нет; иначе (страница за концом списка или курсор) - COUNT
+        if not items and params.page == 1 and params.after_id is None:
+            total = 0
+        else:
+            total = await db.scalar(select(func.count()).select_from(ProductModel).where(*filters)) or 0
+
+    return _dump_product_page(items, total, params.page, params.page_size, next_cursor)
 
 
 @router.post(path="/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
@@ -152,34 +318,43 @@ async def create_product(product: ProductCreateSchema = Depends(ProductCreateSch
     Создаёт новый товар, привязанный к текущему продавцу (только для 'seller').
     """
 
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id, CategoryModel.is_active == True))
-    category = category_result.first()
-    if category is None:
+    # Перед записью категория проверяется в БД, а не по кэшу: другой воркер мог её уже удалить
+    if not await category_is_active(db, product.category_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
-    image_url = await save_product_image(image) if image else None
-    db_product = ProductModel(**product.model_dump(), seller_id=current_user.id, image_url=image_url)
+    image_url, thumb_url = await save_product_image(image) if image else (None, None)
+    db_product = ProductModel(**product.model_dump(), seller_id=current_user.id, image_url=image_url,
+                              thumb_url=thumb_url)
     db.add(db_product)
+    # refresh() не нужен: id и серверные значения по умолчанию приходят через RETURNING при INSERT
     await db.commit()
-    await db.refresh(db_product)
+    await invalidate_product_cache(category_ids=[db_product.category_id])
     return db_product
 
 
-@router.get(path="/category/{category_id}", response_model=list[ProductSchema], status_code=status.HTTP_200_OK)
-async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+@router.get(path="/category/{category_id}", response_model=ProductList, status_code=status.HTTP_200_OK)
+async def get_products_by_category(category_id: int,
+                                   page: int = Query(1, ge=1),
+                                   page_size: int = Query(20, ge=1, le=100),
+                                   after_id: int | None = Query(None, ge=0,
+                                                                description="Курсор: ID последнего товара предыдущей страницы (вместо page)"),
+                                   db: AsyncSession = Depends(get_async_db)):
     """
-    Возвращает список активных товаров в указанной категории по её ID.
+    Возвращает постраничный список активных товаров в указанной категории по её ID.
     """
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True))
-    category = category_result.first()
-    if category is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found or inactive")
-    product_result = await db.scalars(select(ProductModel).where(ProductModel.category_id == category_id,
-                                                                 ProductModel.is_active == True))
-    products = product_result.all()
-    return products
+    async def load() -> bytes:
+        # Товары выбираются одним JOIN с активной категорией
+        products, next_cursor, _ = await paginate(db, _CATEGORY_PRODUCTS_STMT, {"category_id": category_id},
+                                                  page, page_size, after_id, ProductModel.id)
+        # Существование категории проверяется отдельно, только если товаров нет
+        if not products:
+            if not await category_is_active_cached(db, category_id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found or inactive")
+        return _dump_product_page(products, None, page, page_size, next_cursor)
+
+    content = await cache_get_or_set(category_products_key(category_id), load,
+                                     field=f"{page}:{page_size}:{after_id}")
+    return Response(content=content, media_type="application/json")
 
 
 @router.get(path="/{product_id}", response_model=ProductSchema, status_code=status.HTTP_200_OK)
@@ -187,23 +362,23 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db))
     """
     Возвращает детальную информацию о товаре по его ID.
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    product = product_result.first()
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
-
-    category_result = await db.scalars(select(CategoryModel).where(CategoryModel.id == product.category_id,
-                                                                   CategoryModel.is_active == True))
-    category = category_result.first()
-    if category is None:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
+    async def load() -> bytes:
+        # Товар и активность его категории проверяются одним запросом с JOIN
+        product = await db.scalar(_ACTIVE_PRODUCT_STMT, {"product_id": product_id})
+        if product is None:
+            # Запасной путь только для ошибки: отличаем отсутствующий товар от неактивной категории
+            if not await product_is_active(db, product_id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
+        return ProductSchema.model_validate(product).model_dump_json().encode()
 
-    return product
+    content = await cache_get_or_set(product_key(product_id), load)
+    return Response(content=content, media_type="application/json")
 
 
 @router.put(path="/{product_id}", response_model=ProductSchema, status_code=status.HTTP_200_OK)
 async def update_product(product_id: int,
+                         background_tasks: BackgroundTasks,
                          product: ProductCreateSchema = Depends(ProductCreateSchema.as_form),
                          image: UploadFile | None = File(None),
                          db: AsyncSession = Depends(get_async_db),
@@ -211,53 +386,63 @@ async def update_product(product_id: int,
     """
     Обновляет товар, если он принадлежит текущему продавцу (только для 'seller')
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    db_product = product_result.first()
-
-    if not db_product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-
-    if db_product.seller_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
-
-    category_result = await db.scalars(select(CategoryModel).where(CategoryModel.id == product.category_id,
-                                                                   CategoryModel.is_active == True))
-    db_category = category_result.first()
-
-    if db_category is None:
+    # Проверка владельца, категории и само изменение - один UPDATE ... RETURNING.
+    # Категория проверяется только если она меняется: при той же category_id EXISTS не нужен.
+    row = (await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id, ProductModel.is_active == True,
+               ProductModel.seller_id == current_user.id,
+               or_(ProductModel.category_id == product.category_id,
+                   exists().where(CategoryModel.id == product.category_id, CategoryModel.is_active == True)))
+        .values(**product.model_dump())
+        .returning(ProductModel, _OLD_CATEGORY_ID),
+        {"product_id": product_id})).first()
+
+    if row is None:
+        # Запасной путь только для ошибки: уточняем причину отказа
+        seller_id = await db.scalar(_PRODUCT_SELLER_STMT, {"product_id": product_id})
+        if seller_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        if seller_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
-
-    await db.execute(
-        update(ProductModel).where(ProductModel.id == product_id).values(**product.model_dump())
-    )
+    db_product, old_category_id = row
 
     if image:
-        remove_product_image(db_product.image_url)
-        db_product.image_url = await save_product_image(image)
-
+        # Новый файл сохраняется первым: при той же картинке URL совпадёт и удалять ничего не нужно
+        image_url, thumb_url = await save_product_image(image)
+        if image_url != db_product.image_url:
+            # Миниатюра могла совпасть со старой (то же содержимое под другим image_url) - её не удаляем
+            old_thumb_url = db_product.thumb_url if db_product.thumb_url != thumb_url else None
+            remove_product_image(db_product.image_url, old_thumb_url, background_tasks)
+            db_product.image_url = image_url
+            db_product.thumb_url = thumb_url
+
+    # expire_on_commit=False: строка из RETURNING остаётся актуальной, refresh() не нужен
     await db.commit()
-    await db.refresh(db_product)  # Для консистентности данных
+    # Товар мог перейти в другую категорию: сбрасываются страницы обеих
+    await invalidate_product_cache(product_ids=[db_product.id],
+                                   category_ids=[old_category_id, db_product.category_id])
     return db_product
 
 
 @router.delete(path="/{product_id}", response_model=ProductSchema, status_code=status.HTTP_200_OK)
 async def delete_product(product_id: int,
+                         background_tasks: BackgroundTasks,
                          db: AsyncSession = Depends(get_async_db),
                          current_user: UserModel = Depends(get_current_seller)):
     """
     Выполняет мягкое удаление(логическое и возвращает товар) товар по её ID, устанавливая is_active = False, если он принадлежит текущему продавцу (только для 'seller').
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    product = product_result.first()
+    product = await db.scalar(_SOFT_DELETE_PRODUCT_STMT, {"product_id": product_id, "seller_id": current_user.id})
     if product is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
-    if product.seller_id != current_user.id:
+        seller_id = await db.scalar(_PRODUCT_SELLER_STMT, {"product_id": product_id})
+        if seller_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only delete your own products")
-    await db.execute(update(ProductModel).where(ProductModel.id == product_id).values(is_active=False))
-    remove_product_image(product.image_url)
 
+    # Файл удаляется фоновой задачей уже после успешной фиксации транзакции и отправки ответа
+    remove_product_image(product.image_url, product.thumb_url, background_tasks)
     await db.commit()
-    await db.refresh(product)
+    await invalidate_product_cache(product_ids=[product.id], category_ids=[product.category_id])
     return product
@@ -1,35 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, update
+from collections import defaultdict
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select, update, bindparam, case, cast, type_coerce, Float, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import func
 
 from app.models.reviews import Review as ReviewModel
 from app.models.products import Product as ProductModel
 from app.models.users import User as UserModel
-from app.schemas import Review as ReviewSchema, CreateReview as CreateReviewSchema
+from app.schemas import Review as ReviewSchema, CreateReview as CreateReviewSchema, ReviewList
 from app.db_depends import get_async_db
 from app.auth import get_current_buyer, get_current_user
+from app.cache import invalidate_product_cache, product_is_active
+from app.pagination import paginate
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
-
-async def update_product_rating(db: AsyncSession, product_id: int):
-    result = await db.execute(select(func.avg(ReviewModel.grade))
-                              .where(ReviewModel.product_id == product_id))
-    avg_rating = result.scalar() or 0.0
-    product = await db.get(ProductModel, product_id)
-    product.rating = avg_rating
+# Для проверки существования отзыва достаточно select(1) по Core-таблице: без ORM-контекста выполнения
+_reviews_table = ReviewModel.__table__
+_REVIEW_ACTIVE_STMT = select(1).where(_reviews_table.c.id == bindparam("review_id"),
+                                      _reviews_table.c.is_active == True)
+# Списки выбирают только столбцы ReviewSchema, без построения ORM-объектов
+_REVIEW_COLS = (ReviewModel.id, ReviewModel.comment, ReviewModel.comment_date, ReviewModel.grade,
+                ReviewModel.is_active, ReviewModel.user_id, ReviewModel.product_id)
+# Отзывы только активных товаров: активность товара проверяется JOIN в том же запросе
+_ACTIVE_PRODUCT_REVIEWS_STMT = (
+    select(*_REVIEW_COLS)
+    .join(ProductModel, ProductModel.id == ReviewModel.product_id)
+    .where(ReviewModel.is_active == True, ProductModel.is_active == True)
+)
+MAX_BULK_PRODUCT_IDS = 100
+
+
+# Счётчики меняются на одну оценку за раз: стоимость записи не растёт с числом отзывов.
+# Справа в SET стоят значения строки до UPDATE, поэтому новые сумма и количество считаются явно
+_new_rating_sum = ProductModel.rating_sum + bindparam("grade_delta", type_=Integer)
+_new_rating_count = ProductModel.rating_count + bindparam("count_delta", type_=Integer)
+_UPDATE_RATING_STMT = (
+    update(ProductModel)
+    .where(ProductModel.id == bindparam("product_id"))
+    .values(rating_sum=_new_rating_sum,
+            rating_count=_new_rating_count,
+            rating=case((_new_rating_count > 0, cast(_new_rating_sum, Float) / type_coerce(_new_rating_count, Float)), else_=0.0))
+    .returning(ProductModel.category_id)
+    .execution_options(synchronize_session=False)
+)
+
+
+async def update_product_rating(db: AsyncSession, product_id: int, grade: int, added: bool):
+    """
+    Учитывает добавленную (added=True) или удалённую оценку в рейтинге товара одним UPDATE и фиксирует транзакцию.
+    Изменения отзыва, сделанные в той же сессии, попадают в этот же коммит.
+    """
+    sign = 1 if added else -1
+    category_id = await db.scalar(_UPDATE_RATING_STMT, {"product_id": product_id, "grade_delta": sign * grade,
+                                                        "count_delta": sign})
     await db.commit()
+    # Рейтинг входит в карточку товара и в списки товаров
+    await invalidate_product_cache(product_ids=[product_id], category_ids=[category_id])
 
 
-@router.get(path="/", response_model=list[ReviewSchema], status_code=status.HTTP_200_OK)
-async def get_all_reviews(db: AsyncSession = Depends(get_async_db)):
+@router.get(path="/", response_model=ReviewList, status_code=status.HTTP_200_OK)
+async def get_all_reviews(page: int = Query(1, ge=1),
+                          page_size: int = Query(20, ge=1, le=100),
+                          after_id: int | None = Query(None, ge=0,
+                                                       description="Курсор: ID последнего отзыва предыдущей страницы (вместо page)"),
+                          db: AsyncSession = Depends(get_async_db)):
     """
-    Возвращает все активные отзывы
+    Возвращает постраничный список активных отзывов.
+    Поддерживается keyset-пагинация: next_cursor из ответа передаётся в after_id следующего запроса.
     """
-    reviews_result = await db.scalars(select(ReviewModel).where(ReviewModel.is_active == True))
-    reviews = reviews_result.all()
-    return reviews
+    stmt = select(*_REVIEW_COLS).where(ReviewModel.is_active == True)
+    reviews, next_cursor, _ = await paginate(db, stmt, {}, page, page_size, after_id, ReviewModel.id)
+    return {"items": reviews, "page": page, "page_size": page_size, "next_cursor": next_cursor}
 
 
 @router.get(path="/products/{product_id}", response_model=list[ReviewSchema], status_code=status.HTTP_200_OK)
@@ -37,17 +79,31 @@ async def get_review_by_product(product_id: int, db: AsyncSession = Depends(get_
     """
     Возвращает все отзывы для конкретного товара по его ID
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    product = product_result.first()
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
-    reviews_result = await db.scalars(
-        select(ReviewModel).where(ReviewModel.product_id == product.id, ReviewModel.is_active == True))
+    reviews_result = await db.execute(
+        _ACTIVE_PRODUCT_REVIEWS_STMT.where(ReviewModel.product_id == product_id))
     reviews = reviews_result.all()
+    # Существование товара проверяется отдельно, только если отзывов нет
+    if not reviews and not await product_is_active(db, product_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
     return reviews
 
 
+@router.get(path="/products", response_model=dict[int, list[ReviewSchema]], status_code=status.HTTP_200_OK)
+async def get_reviews_for_products(ids: list[int] = Query(..., min_length=1, max_length=MAX_BULK_PRODUCT_IDS,
+                                                          description="ID товаров: ?ids=1&ids=2"),
+                                   db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает активные отзывы сразу для нескольких товаров одним запросом, сгруппированные по ID товара.
+    Для отсутствующих или неактивных товаров возвращается пустой список.
+    """
+    reviews_result = await db.execute(
+        _ACTIVE_PRODUCT_REVIEWS_STMT.where(ReviewModel.product_id.in_(ids)).order_by(ReviewModel.product_id))
+    reviews_by_product: dict[int, list] = defaultdict(list)
+    for review in reviews_result.all():
+        reviews_by_product[review.product_id].append(review)
+    return {product_id: reviews_by_product.get(product_id, []) for product_id in ids}
+
+
 @router.post(path="/", response_model=ReviewSchema, status_code=status.HTTP_201_CREATED)
 async def create_review(review: CreateReviewSchema,
                         db: AsyncSession = Depends(get_async_db),
@@ -55,17 +111,12 @@ async def create_review(review: CreateReviewSchema,
     """
     Создает новый отзыв о товаре по его ID
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == review.product_id, ProductModel.is_active == True))
-    product = product_result.first()
-    if not product:
+    if not await product_is_active(db, review.product_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
     db_review = ReviewModel(**review.model_dump(), user_id=current_buyer.id)
     db.add(db_review)
-    await db.commit()
-    await db.refresh(db_review)
-
-    await update_product_rating(db, product.id)
+    # INSERT ... RETURNING уходит при автосбросе перед UPDATE рейтинга, коммит у них общий
+    await update_product_rating(db, review.product_id, review.grade, added=True)
 
     return db_review
 
@@ -76,17 +127,21 @@ async def delete_review(review_id: int, db: AsyncSession = Depends(get_async_db)
     """
     Мягкое удаление отзыва(логическое) от имени автора или админа
     """
-    review_result = await db.scalars(
-        select(ReviewModel).where(ReviewModel.id == review_id, ReviewModel.is_active == True))
-    review = review_result.first()
-    if not review:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found or inactive")
-    if review.user_id != current_user.id and current_user.role != "admin":
+    # Проверка прав и удаление - один UPDATE ... RETURNING: автор проверяется в WHERE, админу доступны все отзывы
+    stmt = (update(ReviewModel)
+            .where(ReviewModel.id == review_id, ReviewModel.is_active == True)
+            .values(is_active=False)
+            .returning(ReviewModel.product_id, ReviewModel.grade))
+    if current_user.role != "admin":
+        stmt = stmt.where(ReviewModel.user_id == current_user.id)
+    deleted = (await db.execute(stmt)).first()
+    if deleted is None:
+        # Запасной путь только для ошибки: отличаем отсутствующий отзыв от чужого
+        review_exists = await db.scalar(_REVIEW_ACTIVE_STMT, {"review_id": review_id})
+        if review_exists is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found or inactive")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can`t perform this action")
 
-    review.is_active = False
-    # await db.commit()
-    # await db.refresh(review)
-    await update_product_rating(db, review.product_id)
+    await update_product_rating(db, deleted.product_id, deleted.grade, added=False)
 
     return {"message": "Review deleted"}
@@ -1,13 +1,14 @@
 import jwt
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.models.users import User as UserModel
 from app.schemas import UserCreate, UserRoleUpdate, User as UserSchema, RefreshTokenRequest
 from app.db_depends import get_async_db
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token, is_admin
+from app.auth import hash_password_async, verify_password_async, create_access_token, create_refresh_token, is_admin
 from app.config import SECRET_KEY, ALGORITHM
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -18,21 +19,18 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)
     """
     Регистрирует нового пользователя с ролью 'buyer' или 'seller'.
     """
-    # Проверка уникальности email
-    result = await db.scalars(select(UserModel).where(UserModel.email == user.email))
-    if result.first():
+    # Уникальность email обеспечивает уникальный индекс: INSERT ... ON CONFLICT DO NOTHING RETURNING
+    # вставляет пользователя за один запрос и без гонки между проверкой и вставкой
+    db_user = await db.scalar(
+        insert(UserModel)
+        .values(email=user.email, hashed_password=await hash_password_async(user.password), role=user.role)
+        .on_conflict_do_nothing(index_elements=[UserModel.email])
+        .returning(UserModel)
+    )
+    if db_user is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail="Email already registered")
 
-    # Создание объекта пользователя с хешированным паролем
-    db_user = UserModel(
-        email=user.email,
-        hashed_password=hash_password(user.password),
-        role=user.role
-    )
-
-    # Добавление в сессию и сохранение в базе
-    db.add(db_user)
     await db.commit()
     return db_user
 
@@ -43,10 +41,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
     """
     Аутентифицирует пользователя и возвращает access_token и refresh_token.
     """
-    result = await db.scalars(
-        select(UserModel).where(UserModel.email == form_data.username, UserModel.is_active == True))
-    user = result.first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Только нужные для входа столбцы: их отдаёт покрывающий индекс ix_users_active_email
+    user = (await db.execute(
+        select(UserModel.id, UserModel.email, UserModel.role, UserModel.hashed_password)
+        .where(UserModel.email == form_data.username, UserModel.is_active == True))).first()
+    # bcrypt намеренно медленный (~100 мс CPU): проверка выполняется в потоке, чтобы не блокировать event loop
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -90,8 +90,7 @@ async def access_token(
         raise credentials_exception
 
     # Проверяем, что пользователь существует и активен
-    result = await db.scalars(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
-    user = result.first()
+    user = await db.scalar(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
     if user is None:
         raise credentials_exception
 
@@ -135,8 +134,7 @@ async def refresh_token(
         raise credentials_exception
 
     # Проверяем, что пользователь существует и активен
-    result = await db.scalars(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
-    user = result.first()
+    user = await db.scalar(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
     if user is None:
         raise credentials_exception
 
@@ -153,15 +151,16 @@ async def create_admin_user(user: UserCreate,
     """
     Авторизованный администратор создает нового администратора
     """
-    result_user = await db.scalars(select(UserModel).where(UserModel.email == user.email))
-    db_user = result_user.first()
-    if db_user:
+    new_user = await db.scalar(
+        insert(UserModel)
+        .values(email=user.email, hashed_password=await hash_password_async(user.password), role="admin")
+        .on_conflict_do_nothing(index_elements=[UserModel.email])
+        .returning(UserModel)
+    )
+    if new_user is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-    new_user = UserModel(email=user.email, hashed_password=hash_password(user.password), role="admin")
-    db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     return new_user
 
 
@@ -173,12 +172,15 @@ async def update_user_role(user_id: int,
     """
     Администратор меняет роль у пользователя
     """
-    result_user = await db.scalars(select(UserModel).where(UserModel.id == user_id))
-    db_user = result_user.first()
-    if not db_user:
+    # UPDATE ... RETURNING: проверка существования, обновление и получение строки за один запрос
+    db_user = await db.scalar(
+        update(UserModel)
+        .where(UserModel.id == user_id)
+        .values(role=role_data.role)
+        .returning(UserModel)
+    )
+    if db_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    db_user.role = role_data.role
     await db.commit()
-    await db.refresh(db_user)
     return db_user
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
 from fastapi import Form
 from decimal import Decimal
 from datetime import datetime
@@ -25,7 +25,8 @@ class Category(BaseModel):
     is_active: bool = Field(..., description="Активность категории")
 
     # Настройка ConfigDict(from_attributes=True) обеспечивает совместимость с ORM, позволяя преобразовывать данные из базы в JSON-ответы.
-    model_config = ConfigDict(from_attributes=True)
+    # frozen=True: схемы ответов только читаются и сериализуются, случайное изменение экземпляра после валидации - ошибка.
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class ProductCreate(BaseModel):
@@ -67,12 +68,13 @@ class Product(BaseModel):
     description: str | None = Field(default=None, description="Описание товара")
     price: Decimal = Field(..., description="Цена товара в рублях", gt=0, decimal_places=2)
     image_url: str | None = Field(default=None, description="URL изображение товара")
+    thumb_url: str | None = Field(default=None, description="URL миниатюры изображения товара")
     rating: float = Field(..., description="Оценка товара")
     stock: int = Field(..., description="Количество товара на складе")
     category_id: int = Field(..., description="ID категории")
     is_active: bool = Field(..., description="Активность товара")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class ProductList(BaseModel):
@@ -80,11 +82,40 @@ class ProductList(BaseModel):
     Список пагинации для товаров.
     """
     items: list[Product] = Field(description="Товары для текущей страницы")
-    total: int = Field(ge=0, description="Общее количество товаров")
+    total: int | None = Field(default=None, ge=0,
+                              description="Общее количество товаров (только при include_total=true)")
     page: int = Field(ge=1, description="Номер текущей страницы")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: int | None = Field(default=None,
+                                    description="Значение after_id для следующей страницы, None - страниц больше нет")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class ProductFilters(BaseModel):
+    """
+    Параметры запроса списка товаров: пагинация и фильтры.
+    Используется в GET /products/ как набор query-параметров.
+    """
+    page: int = Field(1, ge=1, description="Номер страницы")
+    page_size: int = Field(20, ge=1, le=100, description="Количество элементов на странице")
+    after_id: int | None = Field(None, ge=0, description="Курсор: ID последнего товара предыдущей страницы (вместо page)")
+    include_total: bool = Field(False, description="Посчитать общее количество товаров")
+    category_id: int | None = Field(None, description="ID категории для фильтрации")
+    search: str | None = Field(None, min_length=1, description="Поиск по названию/описанию")
+    min_price: float | None = Field(None, ge=0, description="Минимальная цена товара для фильтрации")
+    max_price: float | None = Field(None, ge=0, description="Максимальная цена товара для фильтрации")
+    in_stock: bool | None = Field(None,
+                                  description="true -только товары в наличии, false - только без остатка для фильтрации")
+    created_at: datetime | None = Field(None, description="Дата создания товара и время YYYY-MM-DD HH:MM:SS")
+    seller_id: int | None = Field(None, description="ID продавца для фильтрации")
+
+    @model_validator(mode="after")
+    def check_price_range(self) -> "ProductFilters":
+        """Проверка логики min_price <= max_price"""
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price не может быть больше max_price")
+        return self
 
 
 class UserCreate(BaseModel):
@@ -105,7 +136,7 @@ class User(BaseModel):
     email: EmailStr
     is_active: bool
     role: str
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class RefreshTokenRequest(BaseModel):
@@ -129,7 +160,20 @@ class Review(BaseModel):
     user_id: int = Field(..., description="ID пользователя")
     product_id: int = Field(..., description="ID товара")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class ReviewList(BaseModel):
+    """
+    Список пагинации для отзывов.
+    """
+    items: list[Review] = Field(description="Отзывы для текущей страницы")
+    page: int = Field(ge=1, description="Номер текущей страницы")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: int | None = Field(default=None,
+                                    description="Значение after_id для следующей страницы, None - страниц больше нет")
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class CartItemBase(BaseModel):
@@ -154,7 +198,7 @@ class CartItem(BaseModel):
     quantity: int = Field(..., ge=1, description="Количество товара")
     product: Product = Field(..., description="Информация о товаре")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class Cart(BaseModel):
@@ -164,7 +208,7 @@ class Cart(BaseModel):
     total_quantity: int = Field(..., ge=0, description="Общее количество товаров")
     total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class OrderItem(BaseModel):
@@ -176,7 +220,7 @@ class OrderItem(BaseModel):
     total_price: Decimal = Field(..., ge=0, description="Сумма по позиции")
     product: Product | None = Field(None, description="Полная информация о товаре")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class Order(BaseModel):
@@ -189,7 +233,7 @@ class Order(BaseModel):
     updated_at: datetime = Field(..., description="Когда последний раз обновлялся")
     items: list[OrderItem] = Field(default_factory=list, description="Список позиций")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class OrderList(BaseModel):
@@ -199,7 +243,7 @@ class OrderList(BaseModel):
     page: int = Field(ge=1, description="Текущая страница")
     page_size: int = Field(ge=1, description="Размер страницы")
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class OrderCheckoutResponse(BaseModel):